@@ -11,4 +11,16 @@ VEHICLE_CLASSES = {
     "7b": "Truk gandengan",
     "7c": "Truk semitrailer",
     "8": "Kendaraan tidak bermotor"
-}
\ No newline at end of file
+}
+
+# Detector labels that are not survey categories themselves (e.g. COCO names
+# from the stock yolov8n.pt) mapped to the closest survey category.
+# Labels already equal to a VEHICLE_CLASSES key (custom best.pt) map to themselves.
+LABEL_ALIASES = {
+    "bicycle": "8",
+    "car": "2",
+    "motorcycle": "1",
+    "motorbike": "1",
+    "bus": "5b",
+    "truck": "6a",
+}
@@ -0,0 +1,73 @@
+# core/class_mapper.py
+import numpy as np
+
+from constants.vehicle_classes import VEHICLE_CLASSES, LABEL_ALIASES
+
+UNMAPPED = -1
+
+
+class ClassMapper:
+    """
+    Translates a model's class indices to survey categories (VEHICLE_CLASSES).
+    The lookup table is built once from model.names, so per-frame mapping,
+    filtering and counting are plain integer-array operations.
+    """
+
+    def __init__(self, model_names, aliases=None):
+        self.survey_classes = list(VEHICLE_CLASSES)
+        self.survey_index = {cls: i for i, cls in enumerate(self.survey_classes)}
+        self.aliases = dict(LABEL_ALIASES if aliases is None else aliases)
+
+        # model.names is a dict {id: label} in ultralytics, accept lists too
+        if isinstance(model_names, dict):
+            names = {int(k): str(v) for k, v in model_names.items()}
+        else:
+            names = {i: str(v) for i, v in enumerate(model_names)}
+        self.model_names = names
+
+        size = (max(names) + 1) if names else 0
+        self.lut = np.full(size, UNMAPPED, dtype=np.int16)
+        for model_id, label in names.items():
+            self.lut[model_id] = self.survey_id(label)
+
+        if size and not np.any(self.lut != UNMAPPED):
+            print("⚠️ Tidak ada kelas model yang cocok dengan VEHICLE_CLASSES, hitungan akan kosong")
+
+    @property
+    def num_classes(self):
+        return len(self.survey_classes)
+
+    def survey_id(self, label):
+        """Survey index for a detector label or survey category name, UNMAPPED if none."""
+        label = str(label)
+        if label in self.survey_index:
+            return self.survey_index[label]
+        alias = self.aliases.get(label.lower())
+        if alias is not None:
+            return self.survey_index.get(alias, UNMAPPED)
+        return UNMAPPED
+
+    def survey_ids(self, classes):
+        """Survey indices for an iterable of labels (unknown labels are dropped)."""
+        ids = [self.survey_id(c) for c in classes]
+        return np.array([i for i in ids if i != UNMAPPED], dtype=np.int16)
+
+    def map(self, cls_arr):
+        """Model class indices -> survey indices (UNMAPPED for unknown/out of range)."""
+        cls_arr = np.asarray(cls_arr, dtype=np.int64).reshape(-1)
+        out = np.full(cls_arr.shape, UNMAPPED, dtype=np.int16)
+        valid = (cls_arr >= 0) & (cls_arr < len(self.lut))
+        out[valid] = self.lut[cls_arr[valid]]
+        return out
+
+    def count(self, survey_arr):
+        """Histogram of survey indices, length num_classes."""
+        survey_arr = np.asarray(survey_arr, dtype=np.int64).reshape(-1)
+        return np.bincount(survey_arr[survey_arr >= 0], minlength=self.num_classes)
+
+    def to_dict(self, counts):
+        """Count array -> {survey class: count} with every category present."""
+        return {cls: int(counts[i]) for i, cls in enumerate(self.survey_classes)}
+
+    def name(self, survey_id):
+        return self.survey_classes[survey_id] if survey_id != UNMAPPED else None
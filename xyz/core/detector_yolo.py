@@ -1,5 +1,8 @@
 # core/detector_yolo.py
+import time
+
 import cv2
+import numpy as np
 try:
     from ultralytics import YOLO
     ULTRALYTICS_OK = True
@@ -7,106 +10,226 @@ except Exception:
     YOLO = None
     ULTRALYTICS_OK = False
 
+from core.model_registry import ModelRegistry, reset_trackers
+from utils.tracking_utils import ClassVoter
+
+# What happens to tracker state when the active model is swapped:
+# carry = hand the running tracker to the new model, IDs stay valid (no double counting)
+# reset = the new model's tracker starts over, open tracks are counted first, totals are kept
+TRACKER_CARRY = "carry"
+TRACKER_RESET = "reset"
+
+
+def _to_numpy(values):
+    """Tensor / array / list from ultralytics Boxes -> numpy array."""
+    try:
+        return values.cpu().numpy()
+    except Exception:
+        try:
+            return values.numpy()
+        except Exception:
+            return np.asarray(list(values))
+
+
 class YOLODetector:
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, registry=None, model_name=None, tracker_policy=TRACKER_CARRY,
+                 count_line=None, max_track_age=30, metrics=None):
         if not ULTRALYTICS_OK:
             raise RuntimeError("ultralytics not installed")
         if not model_path:
             raise ValueError("model_path required")
-        self.model = YOLO(model_path)
-        self.current_counts = {}
-        self.total_counts = {}
-        self.seen_ids = set()
+        if tracker_policy not in (TRACKER_CARRY, TRACKER_RESET):
+            raise ValueError(f"unknown tracker_policy: {tracker_policy}")
+        self.registry = registry if registry is not None else ModelRegistry()
+        self.tracker_policy = tracker_policy
+        self._pending_model = None
+        # count_line ((x1, y1), (x2, y2)) in pixels: count a track when it crosses it,
+        # None: count when the track disappears
+        self.count_line = count_line
+        self.max_track_age = max_track_age
+        # optional core.traffic_metrics.TrafficMetrics fed with the tracked boxes
+        self.metrics = metrics
+        self._use(self.registry.load(model_name or model_path, model_path, background=False))
+        self.reset()
+
+    def _use(self, entry):
+        self.model_name = entry.name
+        self.model = entry.model
+        # resolved once per model: model class id -> survey class index
+        self.mapper = entry.mapper
+
+    def request_model(self, name):
+        """
+        Switch to a registry model without stopping the stream. Loading happens in the
+        background; the swap itself is done by process_frame between two frames.
+        """
+        if name == self.model_name:
+            self._pending_model = None
+            return
+        self.registry.load(name, background=True)
+        self._pending_model = name
+
+    def _apply_pending_model(self):
+        name = self._pending_model
+        if name is None:
+            return
+        entry = self.registry.get(name)
+        if entry is None:
+            if self.registry.error(name) is not None:
+                self._pending_model = None  # failed, stay on the current model
+            return
+
+        old_predictor = getattr(self.model, "predictor", None)
+        trackers = getattr(old_predictor, "trackers", None)
+        new_predictor = getattr(entry.model, "predictor", None)
+        # the registry warm-up registered the new model's tracker callbacks, so its
+        # predictor already has trackers to replace / reset
+        if (self.tracker_policy == TRACKER_CARRY and trackers is not None
+                and hasattr(new_predictor, "trackers")):
+            new_predictor.trackers = trackers
+        else:
+            # new tracker restarts its IDs, old ones would collide
+            reset_trackers(new_predictor)
+            self._count_finalized(self.voter.flush())
+            if self.metrics is not None:
+                self.metrics.release_tracks()
+
+        self._use(entry)
+        self._pending_model = None
+        print(f"🔁 Model aktif: {name}")
 
     def reset(self):
         self.current_counts = {}
         self.total_counts = {}
-        self.seen_ids = set()
+        self.total_array = np.zeros(self.mapper.num_classes, dtype=np.int64)
+        self.voter = ClassVoter(self.mapper.num_classes, max_age=self.max_track_age,
+                                count_line=self.count_line)
+        self._allowed = None
+        self.tracking = False
+        if self.metrics is not None:
+            self.metrics.reset()
+
+    def reset_tracker(self):
+        """
+        Clear tracker state so tracking starts fresh IDs (e.g. new video / chunk / seek).
+        Open tracks are dropped uncounted and metrics start over, totals are kept.
+        """
+        reset_trackers(getattr(self.model, "predictor", None))
+        self.voter.reset()
+        if self.metrics is not None:
+            self.metrics.reset()
+
+    @property
+    def lane_stats(self):
+        """Per-lane flow / density / occupancy / speed / queue from metrics, [] without metrics."""
+        return self.metrics.lane_stats if self.metrics is not None else []
+
+    def _count_finalized(self, classes):
+        if self._allowed is not None:
+            classes = classes[np.isin(classes, self._allowed)]
+        if len(classes):
+            self.total_array += self.mapper.count(classes)
+        self.total_counts = self.mapper.to_dict(self.total_array)
+
+    def finish(self):
+        """End of stream: count the tracks that are still active."""
+        self._count_finalized(self.voter.flush())
+
+    def detect(self, frame, track=True):
+        """
+        Raw detections for a BGR frame, only boxes that map to a survey class.
+        Returns (xyxy float32 Nx4, conf float32 N, survey int16 N, ids int64 N or None)
+        self.tracking tells whether the tracker ran on this frame (ids may still be None).
+        """
+        results = None
+        self.tracking = False
+        if track:
+            try:
+                # Prefer tracking to get stable IDs
+                results = self.model.track(frame, persist=True, verbose=False)
+                self.tracking = True
+            except Exception:
+                results = None
+        if results is None:
+            # fallback to single-frame detection (no ids)
+            results = self.model(frame, verbose=False)
+
+        boxes = getattr(results[0], "boxes", None) if results else None
+        if boxes is None or len(boxes) == 0:
+            return (np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32),
+                    np.zeros(0, dtype=np.int16), None)
+
+        xyxy = _to_numpy(boxes.xyxy).astype(np.float32).reshape(-1, 4)
+        conf = _to_numpy(boxes.conf).astype(np.float32).reshape(-1)
+        survey = self.mapper.map(_to_numpy(boxes.cls))
+
+        ids_arr = None
+        if getattr(boxes, "id", None) is not None:
+            ids_arr = _to_numpy(boxes.id).astype(np.int64).reshape(-1)
+            if len(ids_arr) != len(survey):
+                ids_arr = None
+
+        keep = survey >= 0
+        return xyxy[keep], conf[keep], survey[keep], (ids_arr[keep] if ids_arr is not None else None)
 
-    def process_frame(self, frame, allowed_classes=None):
+    def process_frame(self, frame, allowed_classes=None, timestamp=None):
         """
         Input: frame BGR
-        allowed_classes: list of strings (detector labels) to DRAW/COUNT only; None = all
+        allowed_classes: list of survey classes (VEHICLE_CLASSES keys) to DRAW/COUNT only; None = all
+        timestamp: frame time in seconds (video position), None = wall clock; used by metrics
         Returns: annotated BGR frame
-        Side effects: updates self.current_counts and self.total_counts (uses tracker IDs if available)
+        Side effects: updates self.current_counts and self.total_counts (keyed by survey class,
+        uses tracker IDs if available)
         """
+        self._apply_pending_model()
         self.current_counts = {}
 
-        try:
-            # Prefer tracking to get stable IDs
-            results = self.model.track(frame, persist=True)
-        except Exception:
-            # fallback to single-frame detection (no ids)
-            results = self.model(frame)
-
-        if not results or len(results) == 0:
+        xyxy, conf, survey, ids_arr = self.detect(frame)
+        self._allowed = self.mapper.survey_ids(allowed_classes) if allowed_classes else None
+
+        # tracked boxes: class = confidence-weighted vote over the track's lifetime,
+        # counted once when the track is finalized (crosses count_line / disappears)
+        speeds = None
+        if self.tracking:
+            # frames without confirmed tracks still advance the voter / metrics, so tracks
+            # that left the road are finalized after max_age frames, not at the next vehicle
+            if ids_arr is None:
+                t_ids = np.zeros(0, dtype=np.int64)
+                t_xyxy, t_conf, t_survey = xyxy[:0], conf[:0], survey[:0]
+            else:
+                t_ids, t_xyxy, t_conf, t_survey = ids_arr, xyxy, conf, survey
+            voted, finalized = self.voter.update(t_ids, t_xyxy, t_conf, t_survey)
+            self._count_finalized(finalized)
+            if self.metrics is not None:
+                t = time.monotonic() if timestamp is None else timestamp
+                t_speeds = self.metrics.update(t_ids, t_xyxy, t, frame.shape)
+            if ids_arr is not None:
+                survey = voted
+                if self.metrics is not None:
+                    speeds = t_speeds
+
+        if len(survey) == 0:
             return frame
 
-        r = results[0]
-        boxes = getattr(r, "boxes", None)
-        if boxes is None:
-            return frame
-
-        # Try to extract arrays (works with torch tensors or lists)
-        try:
-            xyxy = boxes.xyxy.cpu().numpy()
-        except Exception:
-            try:
-                xyxy = boxes.xyxy.numpy()
-            except Exception:
-                xyxy = list(boxes.xyxy)
-
-        try:
-            cls_arr = boxes.cls.cpu().numpy()
-        except Exception:
-            try:
-                cls_arr = boxes.cls.numpy()
-            except Exception:
-                cls_arr = list(boxes.cls)
+        # if filter provided, skip other classes
+        if self._allowed is not None:
+            keep = np.isin(survey, self._allowed)
+            xyxy = xyxy[keep]
+            survey = survey[keep]
+            if speeds is not None:
+                speeds = speeds[keep]
 
-        ids_arr = None
-        if hasattr(boxes, "id") and boxes.id is not None:
-            try:
-                ids_arr = boxes.id.cpu().numpy()
-            except Exception:
-                try:
-                    ids_arr = boxes.id.numpy()
-                except Exception:
-                    ids_arr = list(boxes.id)
-
-        names = self.model.names  # mapping id -> label
+        self.current_counts = self.mapper.to_dict(self.mapper.count(survey))
 
         annotated = frame.copy()
-        n = len(xyxy)
-        for i in range(n):
-            box = xyxy[i]
-            cls_id = int(cls_arr[i]) if len(cls_arr) > i else None
-            cls_name = str(names.get(cls_id, str(cls_id)))
-
-            # if filter provided, skip other classes
-            if allowed_classes and cls_name not in allowed_classes:
-                continue
-
-            # count current
-            self.current_counts[cls_name] = self.current_counts.get(cls_name, 0) + 1
-
-            # count unique total if id available
-            obj_id = None
-            if ids_arr is not None and len(ids_arr) > i:
-                try:
-                    obj_id = int(ids_arr[i])
-                except Exception:
-                    obj_id = None
-
-            if obj_id is not None:
-                if obj_id not in self.seen_ids:
-                    self.seen_ids.add(obj_id)
-                    self.total_counts[cls_name] = self.total_counts.get(cls_name, 0) + 1
-
+        for i, (box, sid) in enumerate(zip(xyxy, survey.tolist())):
+            cls_name = self.mapper.name(sid)
+            if speeds is not None:
+                cls_name = f"{cls_name} {speeds[i]:.0f}km/h"
             # draw box + label
             x1, y1, x2, y2 = map(int, box[:4])
             cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 200, 0), 2)
             cv2.putText(annotated, cls_name, (x1, max(15, y1 - 6)),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 200, 0), 2)
 
-        return annotated
\ No newline at end of file
+        return annotated
@@ -0,0 +1,395 @@
+# core/live_counts.py
+"""
+Local live-counts API (HTTP + WebSocket, asyncio, stdlib only).
+
+    GET /cameras                          -> ["cam1", ...]
+    GET /counts                           -> snapshot of every camera / window
+    GET /counts?camera=cam1&window=15     -> counts of the last 15 minutes for cam1 (10 s bins,
+                                             "since" = start of the oldest bin)
+    GET /lanes?camera=cam1                -> per-lane flow / density / queue of cam1
+    GET /ws  (WebSocket upgrade)          -> snapshot pushed every second
+
+Headless, dari folder xyz:
+    python -m core.live_counts video.mp4 --camera cam1 --model model/best.pt --port 8765
+    python -m core.live_counts video.mp4 --camera cam1 --camera-config config/camera.json
+
+/lanes needs a --camera-config (homography + lane polygons, see
+core.traffic_metrics.load_camera_config) for the camera, otherwise it is [].
+
+Embedded: create a CountHub, start LiveCountServer(hub).start_in_thread() and call
+hub.publish(...) from the detection loop. publish is O(classes) under a short lock;
+snapshots are built once per tick in the server thread, so clients never touch the
+detection loop.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from constants.vehicle_classes import VEHICLE_CLASSES
+
+WINDOWS_MIN = (5, 15, 60)
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class RollingCounts:
+    """
+    Count bins of bin_s seconds in a ring plus a running sum per window, so a
+    "last N minutes" query is a read of one array instead of a scan. A window covers
+    its N minutes up to the current (partial) bin, i.e. at most bin_s seconds short.
+    """
+
+    def __init__(self, num_classes, windows=WINDOWS_MIN, bin_s=10):
+        self.windows = tuple(sorted(windows))
+        if any(w * 60 % bin_s for w in self.windows):
+            raise ValueError("bin_s must divide every window")
+        self.bin_s = bin_s
+        self.window_bins = tuple(w * 60 // bin_s for w in self.windows)
+        self.size = self.window_bins[-1]
+        self.bins = np.zeros((self.size, num_classes), dtype=np.int64)
+        self.sums = np.zeros((len(self.windows), num_classes), dtype=np.int64)
+        self.bin = None
+
+    def _advance(self, b):
+        if self.bin is None:
+            self.bin = b
+            return
+        steps = min(b - self.bin, self.size)
+        for m in range(self.bin + 1, self.bin + 1 + steps):
+            # the bins that fall out of each window, then reuse the oldest bin
+            for i, n in enumerate(self.window_bins):
+                self.sums[i] -= self.bins[(m - n) % self.size]
+            self.bins[m % self.size] = 0
+        if b - self.bin > self.size:
+            self.bins[:] = 0
+            self.sums[:] = 0
+        self.bin = max(self.bin, b)
+
+    def add(self, counts, t):
+        b = int(t // self.bin_s)
+        self._advance(b)
+        if b < self.bin - self.size + 1:
+            return  # older than the largest window
+        self.bins[b % self.size] += counts
+        for i, n in enumerate(self.window_bins):
+            if b > self.bin - n:
+                self.sums[i] += counts
+
+    def window(self, minutes, t):
+        self._advance(int(t // self.bin_s))
+        return self.sums[self.windows.index(minutes)].copy()
+
+    def window_start(self, minutes):
+        """Start time of the oldest bin in the window (None before the first add)."""
+        if self.bin is None:
+            return None
+        n = self.window_bins[self.windows.index(minutes)]
+        return float((self.bin - n + 1) * self.bin_s)
+
+
+class CountHub:
+    """Thread-safe store of live / total / rolling counts per camera."""
+
+    def __init__(self, windows=WINDOWS_MIN):
+        self.classes = list(VEHICLE_CLASSES)
+        self.windows = tuple(sorted(windows))
+        self._lock = threading.Lock()
+        self._cameras = {}
+
+    def publish(self, camera, total, live=None, t=None, lanes=None):
+        """
+        Called by the detection loop with the camera's cumulative totals (array or
+        dict keyed by VEHICLE_CLASSES), optionally the live per-frame counts and the
+        per-lane traffic metrics (YOLODetector.lane_stats).
+        Rolling windows are fed with the increase since the previous call.
+        """
+        t = time.time() if t is None else t
+        total = self._as_array(total)
+        live = self._as_array(live) if live is not None else None
+        with self._lock:
+            cam = self._cameras.get(camera)
+            if cam is None:
+                cam = {"rolling": RollingCounts(len(self.classes), self.windows),
+                       "total": np.zeros(len(self.classes), dtype=np.int64),
+                       "live": np.zeros(len(self.classes), dtype=np.int64), "lanes": [], "t": t}
+                self._cameras[camera] = cam
+            delta = total - cam["total"]
+            if (delta < 0).any():
+                delta = total  # detector was reset
+            if delta.any():
+                cam["rolling"].add(delta, t)
+            cam["total"] = total
+            if live is not None:
+                cam["live"] = live
+            if lanes is not None:
+                cam["lanes"] = list(lanes)
+            cam["t"] = t
+
+    def _as_array(self, counts):
+        if isinstance(counts, dict):
+            return np.array([counts.get(c, 0) for c in self.classes], dtype=np.int64)
+        return np.asarray(counts, dtype=np.int64).copy()
+
+    def cameras(self):
+        with self._lock:
+            return list(self._cameras)
+
+    def _to_dict(self, arr):
+        return {c: int(n) for c, n in zip(self.classes, arr.tolist())}
+
+    def query(self, camera, window, t=None):
+        t = time.time() if t is None else t
+        with self._lock:
+            cam = self._cameras.get(camera)
+            if cam is None:
+                return None
+            counts = cam["rolling"].window(window, t)
+            since = cam["rolling"].window_start(window)
+        return {"camera": camera, "window_min": window, "since": since, "counts": self._to_dict(counts)}
+
+    def lanes(self, camera):
+        with self._lock:
+            cam = self._cameras.get(camera)
+            return None if cam is None else {"camera": camera, "lanes": cam["lanes"]}
+
+    def snapshot(self, t=None):
+        t = time.time() if t is None else t
+        out = {"time": t, "cameras": {}}
+        with self._lock:
+            for name, cam in self._cameras.items():
+                out["cameras"][name] = {
+                    "updated": cam["t"],
+                    "live": self._to_dict(cam["live"]),
+                    "total": self._to_dict(cam["total"]),
+                    "windows": {str(w): self._to_dict(cam["rolling"].window(w, t)) for w in self.windows},
+                    "lanes": cam["lanes"],
+                }
+        return out
+
+
+def _ws_frame(payload, opcode=0x1):
+    n = len(payload)
+    if n < 126:
+        header = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    return header + payload
+
+
+class LiveCountServer:
+    """
+    Minimal HTTP/1.1 + WebSocket server over a CountHub. One snapshot is serialized
+    per tick and shared by every client; slow WebSocket clients are dropped instead
+    of buffering without bound.
+    """
+
+    def __init__(self, hub, host="127.0.0.1", port=8765, tick_s=1.0, max_buffer=1 << 20):
+        self.hub = hub
+        self.host = host
+        self.port = port
+        self.tick_s = tick_s
+        self.max_buffer = max_buffer
+        self._clients = set()
+        self._snapshot = b"{}"
+        self._loop = None
+        self._server = None
+
+    async def _tick(self):
+        while True:
+            self._snapshot = json.dumps(self.hub.snapshot()).encode()
+            frame = _ws_frame(self._snapshot)
+            for writer in list(self._clients):
+                if writer.is_closing() or writer.transport.get_write_buffer_size() > self.max_buffer:
+                    self._clients.discard(writer)
+                    writer.close()
+                    continue
+                writer.write(frame)
+            await asyncio.sleep(self.tick_s)
+
+    async def _respond(self, writer, status, body, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            f"Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+        writer.close()
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=10)
+        except Exception:
+            writer.close()
+            return
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            await self._respond(writer, "400 Bad Request", {"error": "bad request"})
+            return
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                k, v = line.split(":", 1)
+                headers[k.strip().lower()] = v.strip()
+
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        if method != "GET":
+            await self._respond(writer, "405 Method Not Allowed", {"error": "GET only"})
+        elif url.path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+            await self._websocket(reader, writer, headers)
+        elif url.path == "/cameras":
+            await self._respond(writer, "200 OK", self.hub.cameras())
+        elif url.path == "/counts" and "camera" in params:
+            await self._counts(writer, params)
+        elif url.path == "/counts":
+            await self._respond(writer, "200 OK", self._snapshot)
+        elif url.path == "/lanes" and "camera" in params:
+            result = self.hub.lanes(params["camera"][0])
+            if result is None:
+                await self._respond(writer, "404 Not Found", {"error": f"unknown camera {params['camera'][0]}"})
+            else:
+                await self._respond(writer, "200 OK", result)
+        else:
+            await self._respond(writer, "404 Not Found", {"error": "not found"})
+
+    async def _counts(self, writer, params):
+        camera = params["camera"][0]
+        try:
+            window = int(params.get("window", [self.hub.windows[0]])[0])
+        except ValueError:
+            window = None
+        if window not in self.hub.windows:
+            await self._respond(writer, "400 Bad Request",
+                                {"error": f"window must be one of {list(self.hub.windows)}"})
+            return
+        result = self.hub.query(camera, window)
+        if result is None:
+            await self._respond(writer, "404 Not Found", {"error": f"unknown camera {camera}"})
+        else:
+            await self._respond(writer, "200 OK", result)
+
+    async def _websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            await self._respond(writer, "400 Bad Request", {"error": "missing Sec-WebSocket-Key"})
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        writer.write(_ws_frame(self._snapshot))
+        self._clients.add(writer)
+        try:
+            # only read to notice close / ping; data from clients is ignored
+            while True:
+                b1, b2 = await reader.readexactly(2)
+                opcode, n = b1 & 0x0F, b2 & 0x7F
+                if n == 126:
+                    n = struct.unpack("!H", await reader.readexactly(2))[0]
+                elif n == 127:
+                    n = struct.unpack("!Q", await reader.readexactly(8))[0]
+                mask = await reader.readexactly(4) if b2 & 0x80 else b"\0\0\0\0"
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(n)))
+                if opcode == 0x8:
+                    writer.write(_ws_frame(b"", 0x8))
+                    break
+                if opcode == 0x9:
+                    writer.write(_ws_frame(payload, 0xA))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    async def serve(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        print(f"🌐 Live counts API di http://{self.host}:{self.port}")
+        async with self._server:
+            await asyncio.gather(self._server.serve_forever(), self._tick())
+
+    def start_in_thread(self):
+        """Run the server on its own event loop in a daemon thread."""
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self.serve())
+            except Exception as e:
+                print("❌ Live counts API berhenti:", e)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+
+def _run_detection(hub, camera, source, model_path, camera_config=None):
+    import os
+
+    import cv2
+    from core.detector_yolo import YOLODetector
+    from core.traffic_metrics import TrafficMetrics, load_camera_config
+
+    metrics = None
+    if camera_config:
+        try:
+            calibration, lanes = load_camera_config(camera_config)
+            metrics = TrafficMetrics(calibration, lanes)
+        except Exception as e:
+            print(f"❌ {camera}: gagal load kalibrasi kamera:", e)
+    detector = YOLODetector(model_path=model_path, metrics=metrics)
+    # files: metrics run on video time (faster/slower than real time is fine),
+    # streams: wall clock (timestamp None)
+    video_time = os.path.isfile(source)
+    cap = cv2.VideoCapture(source)
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        t = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0 if video_time else None
+        detector.process_frame(frame, timestamp=t)
+        hub.publish(camera, detector.total_array,
+                    [detector.current_counts.get(c, 0) for c in hub.classes], lanes=detector.lane_stats)
+    cap.release()
+    detector.finish()
+    hub.publish(camera, detector.total_array)
+    print(f"✅ {camera}: stream selesai")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Headless detection + live counts API")
+    p.add_argument("sources", nargs="+", help="video files / stream URLs, one per camera")
+    p.add_argument("--camera", action="append", help="camera name per source (default cam1, cam2, ...)")
+    p.add_argument("--model", default="model/best.pt")
+    p.add_argument("--camera-config", action="append",
+                   help="camera calibration / lanes JSON per source, enables /lanes")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    args = p.parse_args(argv)
+
+    names = args.camera or []
+    names += [f"cam{i + 1}" for i in range(len(names), len(args.sources))]
+    configs = args.camera_config or []
+    configs += [None] * (len(args.sources) - len(configs))
+    hub = CountHub()
+    for name, source, config in zip(names, args.sources, configs):
+        threading.Thread(target=_run_detection, args=(hub, name, source, args.model, config),
+                         daemon=True).start()
+    try:
+        asyncio.run(LiveCountServer(hub, args.host, args.port).serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# core/model_registry.py
+import os
+import threading
+import time
+
+import numpy as np
+try:
+    from ultralytics import YOLO
+    ULTRALYTICS_OK = True
+except Exception:
+    YOLO = None
+    ULTRALYTICS_OK = False
+
+from core.class_mapper import ClassMapper
+
+
+def reset_trackers(predictor):
+    """
+    Clear tracker state in place. Never delete predictor.trackers: the next track()
+    would register its tracking callbacks a second time.
+    """
+    for tracker in getattr(predictor, "trackers", None) or []:
+        tracker.reset()
+
+
+def limit_torch_threads(workers):
+    """Give each of `workers` inference processes an equal share of the cores."""
+    try:
+        import torch
+    except Exception:
+        return
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // max(1, workers)))
+
+
+class ModelEntry:
+    def __init__(self, name, path, model, mapper, load_s, warmup_s):
+        self.name = name
+        self.path = path
+        self.model = model
+        self.mapper = mapper
+        self.load_s = load_s
+        self.warmup_s = warmup_s
+
+
+class ModelRegistry:
+    """
+    Cache of loaded + warmed-up models, keyed by a short name ("nano", "small", ...).
+    Any weights/backend ultralytics can open (.pt, .onnx, openvino dir, ...) can be
+    registered. Loading runs in a background thread so the video loop never waits;
+    YOLODetector picks the new entry up between frames.
+    """
+
+    def __init__(self, warmup_size=(640, 640)):
+        self.warmup_size = warmup_size
+        self._paths = {}
+        self._entries = {}
+        self._loading = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path):
+        with self._lock:
+            self._paths[name] = path
+
+    def names(self):
+        with self._lock:
+            return list(self._paths)
+
+    def get(self, name):
+        """Loaded entry or None (not loaded yet / still loading / failed)."""
+        with self._lock:
+            return self._entries.get(name)
+
+    def is_ready(self, name):
+        return self.get(name) is not None
+
+    def error(self, name):
+        with self._lock:
+            return self._errors.get(name)
+
+    def load(self, name, path=None, background=True):
+        """
+        Load + warm up a model. background=True returns immediately (the thread,
+        or None if already loaded/loading); background=False blocks and returns
+        the entry.
+        """
+        with self._lock:
+            if path is not None:
+                self._paths[name] = path
+            if name not in self._paths:
+                raise KeyError(f"model '{name}' not registered")
+            if name in self._entries:
+                return None if background else self._entries[name]
+            thread = self._loading.get(name)
+            if thread is None:
+                thread = threading.Thread(target=self._load, args=(name, self._paths[name]), daemon=True)
+                self._loading[name] = thread
+                self._errors.pop(name, None)
+                thread.start()
+
+        if background:
+            return thread
+        thread.join()
+        entry = self.get(name)
+        if entry is None:
+            raise RuntimeError(f"gagal load model '{name}': {self.error(name)}")
+        return entry
+
+    def unload(self, name):
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def _load(self, name, path):
+        try:
+            if not ULTRALYTICS_OK:
+                raise RuntimeError("ultralytics not installed")
+            t0 = time.perf_counter()
+            model = YOLO(path)
+            mapper = ClassMapper(model.names)
+            t1 = time.perf_counter()
+            # first inference allocates buffers / compiles kernels, do it off the video loop.
+            # track() also registers the tracker callbacks once, so trackers can be
+            # handed over to this model later. A blank frame creates no tracks, and
+            # tracker.reset() here would zero the ID counter shared with live streams.
+            h, w = self.warmup_size
+            model.track(np.zeros((h, w, 3), dtype=np.uint8), persist=True, verbose=False)
+            t2 = time.perf_counter()
+            entry = ModelEntry(name, path, model, mapper, t1 - t0, t2 - t1)
+            with self._lock:
+                self._entries[name] = entry
+            print(f"✅ Model '{name}' siap ({path}, load {entry.load_s:.2f}s, warmup {entry.warmup_s:.2f}s)")
+        except Exception as e:
+            with self._lock:
+                self._errors[name] = e
+            print(f"❌ Gagal load model '{name}':", e)
+        finally:
+            with self._lock:
+                self._loading.pop(name, None)
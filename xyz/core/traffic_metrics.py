@@ -0,0 +1,238 @@
+# core/traffic_metrics.py
+import json
+
+import cv2
+import numpy as np
+
+from utils.tracking_utils import TrackSlots
+
+VEHICLE_LENGTH_M = 5.0
+
+
+class RoadCalibration:
+    """Homography image (pixels) -> road plane (meters) for one camera."""
+
+    def __init__(self, image_points, world_points):
+        image_points = np.asarray(image_points, dtype=np.float32).reshape(-1, 2)
+        world_points = np.asarray(world_points, dtype=np.float32).reshape(-1, 2)
+        if len(image_points) < 4 or len(image_points) != len(world_points):
+            raise ValueError("calibration needs >= 4 matching image/world points")
+        self.image_points = image_points
+        self.world_points = world_points
+        self.H, _ = cv2.findHomography(image_points, world_points)
+        if self.H is None:
+            raise ValueError("degenerate calibration points")
+
+    def to_world(self, points):
+        """Nx2 pixel points -> Nx2 road-plane points in meters."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        homog = np.hstack([points, np.ones((len(points), 1))]) @ self.H.T
+        return homog[:, :2] / homog[:, 2:3]
+
+
+class Lane:
+    def __init__(self, name, polygon, length_m=None):
+        self.name = name
+        self.polygon = np.asarray(polygon, dtype=np.int32).reshape(-1, 2)
+        self.length_m = length_m
+
+
+def load_camera_config(path):
+    """
+    Per-camera JSON:
+    {"image_points": [[x, y], ...], "world_points": [[X, Y], ...],
+     "lanes": [{"name": "masuk", "polygon": [[x, y], ...], "length_m": 40}, ...]}
+    Returns (RoadCalibration, [Lane]).
+    """
+    with open(path) as f:
+        cfg = json.load(f)
+    calibration = RoadCalibration(cfg["image_points"], cfg["world_points"])
+    lanes = [Lane(lane["name"], lane["polygon"], lane.get("length_m")) for lane in cfg.get("lanes", [])]
+    return calibration, lanes
+
+
+class TrafficMetrics:
+    """
+    Speed, flow, density, occupancy and queue length from tracker output.
+    Per-track state (smoothed road-plane position history, speed, lane) lives in
+    fixed-size arrays indexed by TrackSlots slot, and every update is a handful of
+    NumPy operations over the active tracks.
+
+    Per lane (rolling window of window_s seconds):
+      flow_vph      vehicles entering the lane, per hour
+      density_vpkm  vehicles currently in the lane, per km
+      occupancy     fraction of frames with at least one vehicle in the lane
+      mean_kmh      mean speed of the vehicles in the lane
+      queue_m       length of the stopped group (speed < queue_kmh) along the lane
+    """
+
+    def __init__(self, calibration, lanes=(), capacity=512, history=15, max_age=30,
+                 window_s=300, queue_kmh=5.0, smoothing=0.5):
+        self.calibration = calibration
+        self.lanes = list(lanes)
+        self.history = history
+        self.max_age = max_age
+        self.window_s = window_s
+        self.queue_kmh = queue_kmh
+        self.smoothing = smoothing
+
+        self.tracks = TrackSlots(capacity)
+        self.pos = np.zeros((capacity, 2), dtype=np.float64)
+        self.hist = np.zeros((capacity, history, 2), dtype=np.float64)
+        self.hist_t = np.zeros((capacity, history), dtype=np.float64)
+        self.hist_n = np.zeros(capacity, dtype=np.int64)
+        self.speed = np.zeros(capacity, dtype=np.float64)  # m/s
+        self.lane = np.full(capacity, -1, dtype=np.int16)
+
+        n = len(self.lanes)
+        self.flow_bins = np.zeros((n, window_s), dtype=np.int32)
+        self.occupied_bins = np.zeros((n, window_s), dtype=np.int32)
+        self.frame_bins = np.zeros(window_s, dtype=np.int32)
+        self.bin_sec = np.full(window_s, -1, dtype=np.int64)
+
+        # lane geometry on the road plane: main axis (for queue length) and length
+        self.lane_axis = np.zeros((n, 2), dtype=np.float64)
+        self.lane_length_m = np.zeros(n, dtype=np.float64)
+        for i, lane in enumerate(self.lanes):
+            world = calibration.to_world(lane.polygon)
+            d = np.linalg.norm(world[:, None] - world[None], axis=2)
+            a, b = np.unravel_index(np.argmax(d), d.shape)
+            self.lane_axis[i] = (world[b] - world[a]) / max(d[a, b], 1e-6)
+            self.lane_length_m[i] = lane.length_m or d[a, b]
+
+        self._lane_map = None
+        self._last_t = None
+        self.lane_stats = []
+
+    def reset(self):
+        self.tracks.reset()
+        self.flow_bins[:] = 0
+        self.occupied_bins[:] = 0
+        self.frame_bins[:] = 0
+        self.bin_sec[:] = -1
+        self._last_t = None
+        self.lane_stats = []
+
+    def release_tracks(self):
+        """Forget every open track (tracker restarted its IDs), flow / occupancy bins are kept."""
+        active = self.tracks.active()
+        self.lane[active] = -1
+        self.tracks.release(active)
+
+    def _lane_map_for(self, shape):
+        h, w = shape[:2]
+        if self._lane_map is None or self._lane_map.shape != (h, w):
+            # pixel -> lane index lookup, built once per frame size
+            self._lane_map = np.full((h, w), -1, dtype=np.int16)
+            for i, lane in enumerate(self.lanes):
+                cv2.fillPoly(self._lane_map, [lane.polygon], i)
+        return self._lane_map
+
+    def _bin(self, t):
+        sec = int(t)
+        idx = sec % self.window_s
+        if self.bin_sec[idx] != sec:
+            self.flow_bins[:, idx] = 0
+            self.occupied_bins[:, idx] = 0
+            self.frame_bins[idx] = 0
+            self.bin_sec[idx] = sec
+        return idx
+
+    def update(self, ids, xyxy, t, frame_shape):
+        """
+        ids/xyxy of the tracked boxes, t = frame time in seconds.
+        Returns speed in km/h per box. If t goes backwards (seek / looped video) the
+        tracks and time bins no longer match, so everything starts over.
+        """
+        if self._last_t is not None and t < self._last_t:
+            self.reset()
+        self._last_t = t
+        slots, new, _ = self.tracks.assign(ids)
+
+        # ground contact point = bottom center of the box
+        foot = np.stack([(xyxy[:, 0] + xyxy[:, 2]) / 2, xyxy[:, 3]], axis=1)
+        world = self.calibration.to_world(foot)
+
+        fresh = slots[new]
+        self.pos[fresh] = world[new]
+        self.hist_n[fresh] = 0
+        self.speed[fresh] = 0
+        prev_lane = np.where(new, -1, self.lane[slots])
+
+        a = self.smoothing
+        self.pos[slots] = a * world + (1 - a) * self.pos[slots]
+        k = self.hist_n[slots] % self.history
+        self.hist[slots, k] = self.pos[slots]
+        self.hist_t[slots, k] = t
+        self.hist_n[slots] += 1
+
+        # displacement over the stored window of smoothed positions
+        oldest = np.where(self.hist_n[slots] >= self.history, (k + 1) % self.history, 0)
+        dt = t - self.hist_t[slots, oldest]
+        dist = np.linalg.norm(self.pos[slots] - self.hist[slots, oldest], axis=1)
+        self.speed[slots] = np.where(dt > 0, dist / np.maximum(dt, 1e-6), self.speed[slots])
+
+        n = len(self.lanes)
+        if n:
+            lane_map = self._lane_map_for(frame_shape)
+            h, w = lane_map.shape
+            px = np.clip(foot[:, 0].astype(np.int64), 0, w - 1)
+            py = np.clip(foot[:, 1].astype(np.int64), 0, h - 1)
+            lane = lane_map[py, px]
+            self.lane[slots] = lane
+
+            idx = self._bin(t)
+            entered = (lane >= 0) & (lane != prev_lane)
+            self.flow_bins[:, idx] += np.bincount(lane[entered], minlength=n).astype(np.int32)
+            in_lane = lane >= 0
+            count = np.bincount(lane[in_lane], minlength=n)
+            self.occupied_bins[:, idx] += (count > 0)
+            self.frame_bins[idx] += 1
+            self._update_lane_stats(t, slots[in_lane], lane[in_lane], count)
+
+        stale = self.tracks.stale(self.max_age)
+        if len(stale):
+            self.lane[stale] = -1
+            self.tracks.release(stale)
+
+        return self.speed[slots] * 3.6
+
+    def _update_lane_stats(self, t, slots, lane, count):
+        n = len(self.lanes)
+        valid = (self.bin_sec >= 0) & (self.bin_sec > int(t) - self.window_s)
+        span_s = max(1, min(self.window_s, int(t) - int(self.bin_sec[valid].min()) + 1)) if valid.any() else 1
+        flow = self.flow_bins[:, valid].sum(axis=1) * 3600.0 / span_s
+        frames = max(1, int(self.frame_bins[valid].sum()))
+        occupancy = self.occupied_bins[:, valid].sum(axis=1) / frames
+
+        # a track's speed is only known from its second frame on
+        speed = self.speed[slots]
+        measured = self.hist_n[slots] >= 2
+        measured_count = np.bincount(lane[measured], minlength=n)
+        mean = np.bincount(lane[measured], weights=speed[measured], minlength=n) / np.maximum(measured_count, 1)
+
+        stopped = measured & (speed * 3.6 < self.queue_kmh)
+        queue = np.zeros(n, dtype=np.float64)
+        if stopped.any():
+            sl = lane[stopped].astype(np.int64)
+            proj = np.einsum("ij,ij->i", self.pos[slots[stopped]], self.lane_axis[sl])
+            hi = np.full(n, -np.inf)
+            lo = np.full(n, np.inf)
+            np.maximum.at(hi, sl, proj)
+            np.minimum.at(lo, sl, proj)
+            has = np.isfinite(hi)
+            queue[has] = hi[has] - lo[has] + VEHICLE_LENGTH_M
+
+        density = count / np.maximum(self.lane_length_m / 1000.0, 1e-6)
+        self.lane_stats = [
+            {
+                "lane": lane_obj.name,
+                "vehicles": int(count[i]),
+                "flow_vph": float(flow[i]),
+                "density_vpkm": float(density[i]),
+                "occupancy": float(occupancy[i]),
+                "mean_kmh": float(mean[i] * 3.6),
+                "queue_m": float(queue[i]),
+            }
+            for i, lane_obj in enumerate(self.lanes)
+        ]
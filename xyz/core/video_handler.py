@@ -0,0 +1,190 @@
+# core/video_handler.py
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+
+def _attach(name):
+    try:
+        # python >= 3.13: the creator owns (and unlinks) the segment
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class FrameRing:
+    """
+    Ring of preallocated frame slots in shared memory, for decode and inference in
+    separate processes. Frames never go through pickle: a writer fills a free slot in
+    place and only sends (slot, seq, timestamp) through a queue; readers get a
+    zero-copy NumPy view of the slot and hand it back with release() when done.
+    Free slots are a queue too, so a slow reader blocks the writer (backpressure)
+    instead of frames being overwritten while in use.
+
+    Create it in the parent, pass it to mp.Process args, call close() in every
+    process and unlink() once in the parent.
+    """
+
+    def __init__(self, shape, slots=8, dtype=np.uint8, ctx=None):
+        ctx = ctx or mp.get_context()
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._shm = shared_memory.SharedMemory(create=True, size=self.frame_bytes * slots)
+        self._owner = True
+        self._free = ctx.Queue()
+        self._ready = ctx.Queue()
+        for i in range(slots):
+            self._free.put(i)
+        self._frames = self._view()
+
+    def _view(self):
+        return np.ndarray((self.slots,) + self.shape, dtype=self.dtype, buffer=self._shm.buf)
+
+    def __getstate__(self):
+        return {"name": self._shm.name, "shape": self.shape, "dtype": self.dtype.str,
+                "slots": self.slots, "free": self._free, "ready": self._ready}
+
+    def __setstate__(self, state):
+        self.shape = state["shape"]
+        self.dtype = np.dtype(state["dtype"])
+        self.slots = state["slots"]
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._shm = _attach(state["name"])
+        self._owner = False
+        self._free = state["free"]
+        self._ready = state["ready"]
+        self._frames = self._view()
+
+    # --- writer side ---
+    def acquire(self, timeout=None):
+        """Block until a slot is free, returns (slot, writable view)."""
+        slot = self._free.get(timeout=timeout)
+        return slot, self._frames[slot]
+
+    def publish(self, slot, seq, timestamp=None):
+        self._ready.put((slot, seq, timestamp))
+
+    def put(self, frame, seq, timestamp=None, timeout=None):
+        """Copy a frame into a free slot and publish it (one memcpy, no pickle)."""
+        slot, view = self.acquire(timeout)
+        view[...] = frame
+        self.publish(slot, seq, timestamp)
+
+    def close_stream(self, readers=1):
+        """Tell readers there are no more frames."""
+        for _ in range(readers):
+            self._ready.put(None)
+
+    # --- reader side ---
+    def get(self, timeout=None):
+        """
+        Next published frame as (slot, seq, timestamp, read-only view), or None at end
+        of stream. The view is only valid until release(slot).
+        """
+        msg = self._ready.get(timeout=timeout)
+        if msg is None:
+            return None
+        slot, seq, timestamp = msg
+        view = self._frames[slot]
+        view.flags.writeable = False
+        return slot, seq, timestamp, view
+
+    def release(self, slot):
+        self._free.put(slot)
+
+    # --- lifetime ---
+    def close(self):
+        self._frames = None
+        self._shm.close()
+
+    def unlink(self):
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.unlink()
+
+
+def probe_shape(source):
+    """(h, w, 3) of a video source, for sizing a FrameRing."""
+    cap = cv2.VideoCapture(source)
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    if not w or not h:
+        raise ValueError(f"cannot open video source: {source}")
+    return (h, w, 3)
+
+
+def decode_worker(ring, source, readers=1, stride=1):
+    """
+    Process target: decode source straight into ring slots (VideoCapture.read writes
+    into the slot view, so no intermediate frame). Sends end-of-stream to `readers`.
+    """
+    cap = cv2.VideoCapture(source)
+    seq = 0
+    try:
+        while True:
+            if seq % stride:
+                if not cap.grab():
+                    break
+                seq += 1
+                continue
+            slot, view = ring.acquire()
+            ret, frame = cap.read(view)
+            if not ret:
+                ring.release(slot)
+                break
+            # position of the frame just read (before read() it is the previous frame's)
+            ts = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if frame is not view and not np.shares_memory(frame, view):
+                view[...] = frame  # backend allocated its own buffer
+            ring.publish(slot, seq, ts)
+            seq += 1
+    finally:
+        cap.release()
+        ring.close_stream(readers)
+        ring.close()
+
+
+def inference_worker(ring, model_path, results, allowed_classes=None, track=True, workers=1):
+    """
+    Process target: run YOLODetector.detect on ring frames and send the small result
+    arrays (seq, timestamp, xyxy, conf, survey, ids) to the results queue.
+    Puts None on results when the stream ends. Use track=False when several
+    inference workers share one stream (each would only see part of the frames).
+    workers = number of inference processes, each gets cores // workers torch threads.
+    """
+    from core.detector_yolo import YOLODetector
+    from core.model_registry import limit_torch_threads
+
+    cv2.setNumThreads(1)
+    limit_torch_threads(workers)
+    detector = YOLODetector(model_path=model_path)
+    allowed = detector.mapper.survey_ids(allowed_classes) if allowed_classes else None
+    try:
+        while True:
+            item = ring.get()
+            if item is None:
+                break
+            slot, seq, ts, frame = item
+            try:
+                xyxy, conf, survey, ids = detector.detect(frame, track=track)
+            finally:
+                ring.release(slot)
+            if allowed is not None:
+                keep = np.isin(survey, allowed)
+                xyxy, conf, survey = xyxy[keep], conf[keep], survey[keep]
+                ids = ids[keep] if ids is not None else None
+            results.put((seq, ts, xyxy, conf, survey, ids))
+    finally:
+        results.put(None)
+        ring.close()
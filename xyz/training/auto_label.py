@@ -0,0 +1,287 @@
+# training/auto_label.py
+"""
+Auto-labelling: run YOLODetector over recorded footage, keep the informative frames
+(low confidence, rare classes, class flips inside a track) and write them as YOLO
+labels for review + retraining.
+
+Jalankan dari folder xyz:
+    python -m training.auto_label rekaman/ --out datasets/auto --weights model/best.pt --workers 4
+
+Footage is split into chunks of --chunk-frames frames that are processed in parallel.
+Finished chunks are recorded in <out>/done_chunks.txt, so re-running (or adding new
+recordings) never decodes already-sampled footage again. Every --val-every-th frame
+goes to <out>/valid instead of <out>/train, so the folder is a trainable dataset.
+"""
+import argparse
+import hashlib
+import multiprocessing as mp
+import os
+import sys
+
+import cv2
+import numpy as np
+
+from constants.vehicle_classes import VEHICLE_CLASSES
+from training.train_pipeline import SPLITS, build_dataset_yaml, count_images
+
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv", ".ts")
+DONE_FILE = "done_chunks.txt"
+HASH_FILE = "hashes.npy"
+
+_detector = None
+
+
+def dhash(frame, size=8):
+    """64-bit difference hash of a BGR frame as np.uint64."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).reshape(-1)
+    return np.packbits(bits).view(">u8")[0].astype(np.uint64)
+
+
+def hamming(hashes, h):
+    """Bit distance between every hash in a uint64 array and h."""
+    return np.bitwise_count(np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(h)))
+
+
+class HashIndex:
+    """Perceptual-hash set, near duplicates (distance <= max_dist) are rejected."""
+
+    def __init__(self, max_dist, hashes=None):
+        self.max_dist = max_dist
+        hashes = np.zeros(0, dtype=np.uint64) if hashes is None else np.asarray(hashes, dtype=np.uint64)
+        self._hashes = np.zeros(max(1024, 2 * len(hashes)), dtype=np.uint64)
+        self._hashes[:len(hashes)] = hashes
+        self._n = len(hashes)
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def hashes(self):
+        return self._hashes[:self._n]
+
+    def _append(self, h):
+        if self._n == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+        self._hashes[self._n] = h
+        self._n += 1
+
+    def add(self, h):
+        """Add h unless a near duplicate is already present. Returns True if added."""
+        if self._n and hamming(self.hashes, h).min() <= self.max_dist:
+            return False
+        self._append(h)
+        return True
+
+
+def find_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                videos.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(VIDEO_EXTS))
+        elif path.lower().endswith(VIDEO_EXTS):
+            videos.append(path)
+    return [os.path.abspath(v) for v in videos]
+
+
+def chunk_key(video, start, end):
+    st = os.stat(video)
+    return f"{video}|{st.st_size}|{start}|{end}"
+
+
+def plan_chunks(videos, chunk_frames, done):
+    jobs = []
+    for video in videos:
+        cap = cv2.VideoCapture(video)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        for start in range(0, max(total, 0), chunk_frames):
+            end = min(start + chunk_frames, total)
+            key = chunk_key(video, start, end)
+            if key not in done:
+                jobs.append((key, video, start, end))
+    return jobs
+
+
+def _init_worker(weights, workers):
+    global _detector
+    from core.detector_yolo import YOLODetector
+    from core.model_registry import limit_torch_threads
+    cv2.setNumThreads(1)
+    limit_torch_threads(workers)
+    _detector = YOLODetector(model_path=weights)
+
+
+def _yolo_lines(xyxy, survey, w, h):
+    lines = []
+    for (x1, y1, x2, y2), sid in zip(xyxy.tolist(), survey.tolist()):
+        cx, cy = (x1 + x2) / 2 / w, (y1 + y2) / 2 / h
+        bw, bh = (x2 - x1) / w, (y2 - y1) / h
+        lines.append(f"{sid} {cx:.6f} {cy:.6f} {bw:.6f} {bh:.6f}")
+    return lines
+
+
+def process_chunk(job, opts):
+    """
+    Decode one chunk, return (key, candidates). Frames between samples are only grab()bed.
+    candidate = dict(name, jpg bytes, hash, label lines, reasons)
+    """
+    key, video, start, end = job
+    det = _detector
+    det.reset_tracker()
+    rare = det.mapper.survey_ids(opts["rare"])
+    track_cls = {}
+    local = HashIndex(opts["max_dist"])
+    prefix = hashlib.sha1(video.encode()).hexdigest()[:8] + "_" + os.path.splitext(os.path.basename(video))[0]
+    candidates = []
+
+    cap = cv2.VideoCapture(video)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    for idx in range(start, end):
+        if (idx - start) % opts["stride"]:
+            if not cap.grab():
+                break
+            continue
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        xyxy, conf, survey, ids = det.detect(frame)
+        if len(survey) == 0:
+            continue
+
+        reasons = []
+        if np.any((conf >= opts["conf_low"]) & (conf < opts["conf_high"])):
+            reasons.append("low_conf")
+        if np.any(np.isin(survey, rare)):
+            reasons.append("rare")
+        if ids is not None:
+            flipped = False
+            for tid, sid in zip(ids.tolist(), survey.tolist()):
+                prev = track_cls.get(tid)
+                if prev is not None and prev != sid:
+                    flipped = True
+                track_cls[tid] = sid
+            if flipped:
+                reasons.append("track_flip")
+        if not reasons or len(candidates) >= opts["max_per_chunk"]:
+            continue
+
+        h = dhash(frame)
+        if not local.add(h):
+            continue
+        keep = conf >= opts["conf_low"]
+        ok, jpg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        if not ok:
+            continue
+        fh, fw = frame.shape[:2]
+        candidates.append({
+            "name": f"{prefix}_{idx:08d}",
+            "jpg": jpg.tobytes(),
+            "hash": h,
+            "labels": _yolo_lines(xyxy[keep], survey[keep], fw, fh),
+            "reasons": reasons,
+        })
+    cap.release()
+    return key, candidates
+
+
+def _process_chunk_star(args):
+    return process_chunk(*args)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Select informative frames from footage and pre-label them")
+    p.add_argument("inputs", nargs="+", help="video files or folders")
+    p.add_argument("--out", required=True, help="output dataset folder")
+    p.add_argument("--weights", default=os.path.join("model", "best.pt"))
+    p.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    p.add_argument("--chunk-frames", type=int, default=3000)
+    p.add_argument("--stride", type=int, default=5, help="run the detector on every N-th frame")
+    p.add_argument("--conf-low", type=float, default=0.25, help="boxes below this are not labelled")
+    p.add_argument("--conf-high", type=float, default=0.5, help="boxes below this make a frame informative")
+    p.add_argument("--rare", default="5b,7b,7c", help="comma separated survey classes")
+    p.add_argument("--max-dist", type=int, default=6, help="dHash distance treated as duplicate")
+    p.add_argument("--max-per-chunk", type=int, default=200)
+    p.add_argument("--val-every", type=int, default=10, help="put one in N written frames in the valid split")
+    return p.parse_args(argv)
+
+
+def _write_yaml(out):
+    try:
+        print("📄 dataset:", build_dataset_yaml(out))
+    except ValueError as e:
+        print("⚠️ dataset.yaml not written:", e)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    dirs = {}
+    for split in ("train", "val"):
+        img_dir = os.path.join(args.out, SPLITS[split], "images")
+        lbl_dir = os.path.join(args.out, SPLITS[split], "labels")
+        os.makedirs(img_dir, exist_ok=True)
+        os.makedirs(lbl_dir, exist_ok=True)
+        dirs[split] = (img_dir, lbl_dir)
+    # frames already in the splits, so the ratio holds across runs
+    n_split = {split: count_images(args.out, SPLITS[split]) for split in dirs}
+    val_every = max(2, args.val_every)
+
+    done_path = os.path.join(args.out, DONE_FILE)
+    hash_path = os.path.join(args.out, HASH_FILE)
+    done = set()
+    if os.path.exists(done_path):
+        with open(done_path) as f:
+            done = {line.rstrip("\n") for line in f if line.strip()}
+    index = HashIndex(args.max_dist, np.load(hash_path) if os.path.exists(hash_path) else None)
+
+    jobs = plan_chunks(find_videos(args.inputs), args.chunk_frames, done)
+    print(f"🎞 {len(jobs)} chunk(s) to process, {len(done)} already done, {len(index)} frames in set")
+    if not jobs:
+        _write_yaml(args.out)
+        return 0
+
+    unknown = [c for c in args.rare.split(",") if c and c not in VEHICLE_CLASSES]
+    if unknown:
+        print("❌ unknown classes in --rare:", unknown)
+        return 1
+    opts = {
+        "stride": max(1, args.stride),
+        "conf_low": args.conf_low,
+        "conf_high": args.conf_high,
+        "rare": [c for c in args.rare.split(",") if c],
+        "max_dist": args.max_dist,
+        "max_per_chunk": args.max_per_chunk,
+    }
+
+    written = 0
+    with mp.get_context("spawn").Pool(args.workers, initializer=_init_worker, initargs=(args.weights, args.workers)) as pool, \
+            open(done_path, "a") as done_file:
+        for n, (key, candidates) in enumerate(
+                pool.imap_unordered(_process_chunk_star, [(job, opts) for job in jobs]), 1):
+            for c in candidates:
+                # global dedupe across chunks / videos / previous runs
+                if not index.add(c["hash"]):
+                    continue
+                split = "val" if n_split["val"] * val_every <= sum(n_split.values()) else "train"
+                img_dir, lbl_dir = dirs[split]
+                n_split[split] += 1
+                with open(os.path.join(img_dir, c["name"] + ".jpg"), "wb") as f:
+                    f.write(c["jpg"])
+                with open(os.path.join(lbl_dir, c["name"] + ".txt"), "w") as f:
+                    f.write("\n".join(c["labels"]) + ("\n" if c["labels"] else ""))
+                written += 1
+            np.save(hash_path, index.hashes)
+            done_file.write(key + "\n")
+            done_file.flush()
+            print(f"  [{n}/{len(jobs)}] {len(candidates)} candidate(s), {written} frame(s) written")
+
+    print(f"✅ {written} frame baru di {args.out} (train {n_split['train']}, valid {n_split['val']})")
+    _write_yaml(args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
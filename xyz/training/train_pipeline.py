@@ -0,0 +1,302 @@
+# training/train_pipeline.py
+"""
+Local training pipeline for the 12-class survey model (replaces the Colab/Kaggle notebooks).
+
+Jalankan dari folder xyz:
+    python -m training.train_pipeline --data-dir datasets/12golongan --epochs 150 --workers 4
+    python -m training.train_pipeline --data-dir datasets/12golongan --skip-train --weights model/best.pt --export onnx --quantize
+
+Results stay in the run folder (runs/<name>/weights). Only an explicit --out replaces the
+weights the app uses, e.g. --weights yolo11n.pt --out model --out-name best_n.pt for the
+peak-hour nano model.
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import time
+
+try:
+    from ultralytics import YOLO
+    ULTRALYTICS_OK = True
+except Exception:
+    YOLO = None
+    ULTRALYTICS_OK = False
+
+from constants.vehicle_classes import VEHICLE_CLASSES
+
+SPLITS = {"train": "train", "val": "valid", "test": "test"}
+IMG_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+LABEL_CHECK_FILE = ".label_check.json"
+
+
+def build_dataset_yaml(data_dir, out_path=None):
+    """
+    Write dataset.yaml for data_dir (Roboflow layout: train/valid/test with images + labels).
+    Raises ValueError if train/ or valid/ has no images, test/ is optional.
+    """
+    data_dir = os.path.abspath(data_dir)
+    out_path = out_path or os.path.join(data_dir, "dataset.yaml")
+    names = list(VEHICLE_CLASSES)
+    for key in ("train", "val"):
+        if not count_images(data_dir, SPLITS[key]):
+            raise ValueError(f"no images in {os.path.join(data_dir, SPLITS[key], 'images')} "
+                             f"(the {key} split is required)")
+    lines = [f"path: {data_dir}"]
+    for key, folder in SPLITS.items():
+        if os.path.isdir(os.path.join(data_dir, folder, "images")):
+            lines.append(f"{key}: {folder}/images")
+    lines.append("")
+    lines.append(f"nc: {len(names)}")
+    lines.append("names: [" + ", ".join(f'"{n}"' for n in names) + "]")
+    with open(out_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return out_path
+
+
+def _check_label_file(path, nc):
+    """Returns list of error strings for a YOLO label file (empty = ok)."""
+    errors = []
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            parts = line.split()
+            if not parts:
+                continue
+            if len(parts) != 5:
+                errors.append(f"{path}:{n}: expected 5 values, got {len(parts)}")
+                continue
+            try:
+                cls = int(parts[0])
+                coords = [float(v) for v in parts[1:]]
+            except ValueError:
+                errors.append(f"{path}:{n}: not a number")
+                continue
+            if not 0 <= cls < nc:
+                errors.append(f"{path}:{n}: class {cls} outside 0..{nc - 1}")
+            if any(v < 0.0 or v > 1.0 for v in coords):
+                errors.append(f"{path}:{n}: coordinates not normalized")
+    return errors
+
+
+def validate_labels(data_dir, nc=len(VEHICLE_CLASSES)):
+    """
+    Check every label file once. Results are cached in <data_dir>/.label_check.json keyed by
+    file size + mtime, so later runs only re-read files that changed.
+    Returns (stats dict, list of errors).
+    """
+    cache_path = os.path.join(data_dir, LABEL_CHECK_FILE)
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if cache.get("nc") != nc:
+        cache = {"nc": nc, "files": {}}
+
+    files = {}
+    errors = []
+    stats = {"images": 0, "labels": 0, "missing_labels": 0, "checked": 0}
+    for folder in SPLITS.values():
+        img_dir = os.path.join(data_dir, folder, "images")
+        lbl_dir = os.path.join(data_dir, folder, "labels")
+        if not os.path.isdir(img_dir):
+            continue
+        for fname in sorted(os.listdir(img_dir)):
+            if not fname.lower().endswith(IMG_EXTS):
+                continue
+            stats["images"] += 1
+            lbl = os.path.join(lbl_dir, os.path.splitext(fname)[0] + ".txt")
+            if not os.path.exists(lbl):
+                stats["missing_labels"] += 1  # background image, allowed
+                continue
+            stats["labels"] += 1
+            st = os.stat(lbl)
+            key = os.path.relpath(lbl, data_dir)
+            sig = [st.st_size, st.st_mtime_ns]
+            cached = cache["files"].get(key)
+            if cached and cached["sig"] == sig:
+                file_errors = cached["errors"]
+            else:
+                file_errors = _check_label_file(lbl, nc)
+                stats["checked"] += 1
+            files[key] = {"sig": sig, "errors": file_errors}
+            errors.extend(file_errors)
+
+    cache["files"] = files
+    with open(cache_path, "w") as f:
+        json.dump(cache, f)
+    return stats, errors
+
+
+class EpochTimer:
+    """
+    Ultralytics callbacks that log per-epoch train/val time and throughput to a CSV
+    in the run folder (trainer.save_dir), next to ultralytics' own results.csv.
+    """
+
+    def __init__(self, train_images, csv_name="epoch_times.csv"):
+        self.csv_name = csv_name
+        self.csv_path = None
+        self.train_images = train_images
+        self.rows = []
+        self._t_start = None
+        self._t_train_end = None
+
+    def on_train_epoch_start(self, trainer):
+        self._t_start = time.perf_counter()
+
+    def on_train_epoch_end(self, trainer):
+        self._t_train_end = time.perf_counter()
+
+    def on_fit_epoch_end(self, trainer):
+        now = time.perf_counter()
+        if self._t_start is None:
+            return
+        train_end = self._t_train_end or now
+        train_s = train_end - self._t_start
+        row = {
+            "epoch": trainer.epoch + 1,
+            "train_s": round(train_s, 3),
+            "val_s": round(now - train_end, 3),
+            "img_per_s": round(self.train_images / train_s, 2) if train_s > 0 else 0.0,
+        }
+        self.rows.append(row)
+        print(f"⏱ epoch {row['epoch']}: train {row['train_s']}s, val {row['val_s']}s, "
+              f"{row['img_per_s']} img/s")
+        self.csv_path = os.path.join(str(trainer.save_dir), self.csv_name)
+        with open(self.csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(row))
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+    def attach(self, model):
+        model.add_callback("on_train_epoch_start", self.on_train_epoch_start)
+        model.add_callback("on_train_epoch_end", self.on_train_epoch_end)
+        model.add_callback("on_fit_epoch_end", self.on_fit_epoch_end)
+
+
+def quantize_onnx(onnx_path):
+    """Dynamic INT8 quantization of an exported ONNX model (needs onnxruntime)."""
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except Exception:
+        print("⚠️ onnxruntime not installed, skip quantization")
+        return None
+    out_path = os.path.splitext(onnx_path)[0] + ".int8.onnx"
+    quantize_dynamic(onnx_path, out_path, weight_type=QuantType.QUInt8)
+    return out_path
+
+
+def count_images(data_dir, folder):
+    img_dir = os.path.join(data_dir, folder, "images")
+    if not os.path.isdir(img_dir):
+        return 0
+    return sum(1 for f in os.listdir(img_dir) if f.lower().endswith(IMG_EXTS))
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Train / validate / export the vehicle survey model")
+    p.add_argument("--data-dir", required=True, help="dataset root with train/valid/test folders")
+    p.add_argument("--weights", default="yolo11s.pt", help="pretrained or trained weights")
+    p.add_argument("--epochs", type=int, default=150)
+    p.add_argument("--imgsz", type=int, default=640)
+    p.add_argument("--batch", type=int, default=16)
+    p.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 1))
+    p.add_argument("--device", default="cpu")
+    p.add_argument("--cache", choices=["ram", "disk", "none"], default="disk",
+                   help="cache decoded/resized images (disk = .npy next to images)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--deterministic", action="store_true",
+                   help="reproducible runs (deterministic CUDA/cuDNN kernels, slower)")
+    p.add_argument("--project", default="runs")
+    p.add_argument("--name", default="train")
+    p.add_argument("--skip-train", action="store_true", help="only validate/export --weights")
+    p.add_argument("--export", choices=["onnx", "none"], default="onnx")
+    p.add_argument("--quantize", action="store_true", help="also write an INT8 ONNX model")
+    p.add_argument("--out", default=None,
+                   help="folder to copy best.pt / exports to (e.g. model = replace deployed weights); "
+                        "default: keep them in the run folder")
+    p.add_argument("--out-name", default="best.pt", help="file name of the copied weights in --out")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not ULTRALYTICS_OK:
+        print("❌ ultralytics not installed")
+        return 1
+    data_dir = os.path.abspath(args.data_dir)
+
+    try:
+        yaml_path = build_dataset_yaml(data_dir)
+    except ValueError as e:
+        print("❌", e)
+        return 1
+    print("📄 dataset:", yaml_path)
+
+    t0 = time.perf_counter()
+    stats, errors = validate_labels(data_dir)
+    print(f"🔎 labels: {stats} ({time.perf_counter() - t0:.2f}s)")
+    if errors:
+        for e in errors[:20]:
+            print("  ", e)
+        print(f"❌ {len(errors)} label error(s), fix the dataset first")
+        return 1
+
+    model = YOLO(args.weights)
+    weights = args.weights
+    if not args.skip_train:
+        timer = EpochTimer(count_images(data_dir, SPLITS["train"]))
+        timer.attach(model)
+        model.train(
+            data=yaml_path,
+            epochs=args.epochs,
+            imgsz=args.imgsz,
+            batch=args.batch,
+            workers=args.workers,
+            device=args.device,
+            cache=False if args.cache == "none" else args.cache,
+            seed=args.seed,
+            deterministic=args.deterministic,
+            project=args.project,
+            name=args.name,
+            exist_ok=True,
+        )
+        weights = os.path.join(model.trainer.save_dir, "weights", "best.pt")
+        if timer.csv_path:
+            print("⏱ epoch times:", timer.csv_path)
+        model = YOLO(weights)
+
+    metrics = model.val(data=yaml_path, split="val", imgsz=args.imgsz, batch=args.batch,
+                        workers=args.workers, device=args.device)
+    print("📊 val mAP50-95:", metrics.box.map, "mAP50:", metrics.box.map50)
+    if os.path.isdir(os.path.join(data_dir, SPLITS["test"], "images")):
+        metrics = model.val(data=yaml_path, split="test", imgsz=args.imgsz, batch=args.batch,
+                            workers=args.workers, device=args.device)
+        print("📊 test mAP50-95:", metrics.box.map, "mAP50:", metrics.box.map50)
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        if not args.skip_train:
+            shutil.copy(weights, os.path.join(args.out, args.out_name))
+            print(f"✅ {args.out_name} disalin ke", args.out)
+    else:
+        print("✅ weights:", weights)
+
+    if args.export == "onnx":
+        onnx_out = model.export(format="onnx", imgsz=args.imgsz, device=args.device)
+        if args.out:
+            name = os.path.splitext(args.out_name)[0] + ".onnx"
+            onnx_out = shutil.copy(onnx_out, os.path.join(args.out, name))
+        print("✅ ONNX:", onnx_out)
+        if args.quantize:
+            q_path = quantize_onnx(onnx_out)
+            if q_path:
+                print("✅ ONNX INT8:", q_path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
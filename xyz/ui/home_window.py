@@ -18,12 +18,49 @@ from constants.vehicle_classes import VEHICLE_CLASSES
 # --- detector import ---
 try:
     from core.detector_yolo import YOLODetector
+    from core.model_registry import ModelRegistry
+    from core.traffic_metrics import TrafficMetrics, load_camera_config
+    from core.live_counts import CountHub, LiveCountServer
     DETECTOR_AVAILABLE = True
 except Exception as e:
     print("Detector import failed:", e)
     YOLODetector = None
+    ModelRegistry = None
+    TrafficMetrics = None
     DETECTOR_AVAILABLE = False
 
+# --- models ---
+# 12-class survey models (training/train_pipeline.py): fast nano at peak hours,
+# the more accurate small model off-peak
+MODELS = {
+    "nano": os.path.join("model", "best_n.pt"),
+    "small": os.path.join("model", "best.pt"),
+}
+PEAK_HOURS = [(6, 9), (16, 19)]  # [start, end) jam lokal
+PEAK_MODEL = "nano"
+OFFPEAK_MODEL = "small"
+# last resort when no survey weights can be loaded: COCO only gives classes 1, 2, 5b, 6a, 8
+FALLBACK_MODEL = ("coco", os.path.join("models", "yolov8n.pt"))
+
+# homography + lane polygons of the camera, speed/flow/queue metrics are off without it
+CAMERA_CONFIG = os.path.join("config", "camera.json")
+
+# local live-counts API (HTTP + WebSocket) for dashboards / signal controllers
+LIVE_API_HOST = "127.0.0.1"
+LIVE_API_PORT = 8765
+CAMERA_NAME = "cam1"
+
+
+def model_available(path):
+    return os.path.isfile(path) and os.path.getsize(path) > 0
+
+
+def scheduled_model(hour):
+    for start, end in PEAK_HOURS:
+        if start <= hour < end:
+            return PEAK_MODEL
+    return OFFPEAK_MODEL
+
 
 class DetailWindow(QDialog):
     def __init__(self, vehicle_counts, parent=None):
@@ -61,13 +98,45 @@ class TrafficVisionApp(QWidget):
 
         # --- Detector setup ---
         self.detector = None
+        self.model_registry = None
         if DETECTOR_AVAILABLE:
-            model_path = os.path.join("models", "yolov8n.pt")
-            try:
-                self.detector = YOLODetector(model_path=model_path)
-            except Exception as e:
-                print("❌ Gagal load YOLO model:", e)
-                self.detector = None
+            self.model_registry = ModelRegistry()
+            for name, path in MODELS.items():
+                self.model_registry.register(name, path)
+            metrics = None
+            if os.path.exists(CAMERA_CONFIG):
+                try:
+                    calibration, lanes = load_camera_config(CAMERA_CONFIG)
+                    metrics = TrafficMetrics(calibration, lanes)
+                except Exception as e:
+                    print("❌ Gagal load kalibrasi kamera:", e)
+            # scheduled model first, then the other survey models, then COCO
+            scheduled = scheduled_model(time.localtime().tm_hour)
+            candidates = [(scheduled, MODELS[scheduled])]
+            candidates += [(n, p) for n, p in MODELS.items() if n != scheduled]
+            candidates = [(n, p) for n, p in candidates if model_available(p)]
+            candidates.append(FALLBACK_MODEL)
+            for name, path in candidates:
+                try:
+                    self.detector = YOLODetector(model_path=path, registry=self.model_registry,
+                                                 model_name=name, metrics=metrics)
+                    break
+                except Exception as e:
+                    print(f"❌ Gagal load YOLO model '{name}':", e)
+            if self.detector and self.detector.model_name == FALLBACK_MODEL[0]:
+                print("⚠️ Model COCO dipakai, kelas 3, 4, 5a, 6b, 7a, 7b, 7c tidak terhitung")
+
+        # other models are loaded/warmed up in background, swapped between frames
+        if self.detector:
+            for name in MODELS:
+                if name != self.detector.model_name and model_available(MODELS[name]):
+                    self.model_registry.load(name)
+            self.model_timer = QTimer()
+            self.model_timer.timeout.connect(self.apply_model_schedule)
+            self.model_timer.start(60 * 1000)
+
+            self.count_hub = CountHub()
+            LiveCountServer(self.count_hub, LIVE_API_HOST, LIVE_API_PORT).start_in_thread()
 
         self.capture_dir = "captures"
         os.makedirs(self.capture_dir, exist_ok=True)
@@ -192,6 +261,11 @@ class TrafficVisionApp(QWidget):
             return
         self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
         self.slider.setMaximum(self.total_frames)
+        if self.detector:
+            # tracks of the previous video are counted, then tracker / metrics start over
+            self.detector.finish()
+            self.detector.reset_tracker()
+            self.update_counts()
         self.set_controls_enabled(True)
 
     def play_video(self):
@@ -207,11 +281,17 @@ class TrafficVisionApp(QWidget):
         ret, frame = self.cap.read()
         if not ret:
             self.timer.stop()
+            if self.detector:
+                # tracks still on screen at the end are counted too
+                self.detector.finish()
+                self.update_counts()
             return
 
         if self.detector:
             try:
-                annotated = self.detector.process_frame(frame)
+                t = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                annotated = self.detector.process_frame(frame, timestamp=t)
+                self.update_counts()
             except Exception:
                 annotated = frame
         else:
@@ -228,6 +308,20 @@ class TrafficVisionApp(QWidget):
         pos = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
         self.slider.setValue(pos)
 
+    def apply_model_schedule(self):
+        name = scheduled_model(time.localtime().tm_hour)
+        if name != self.detector.model_name and model_available(MODELS[name]):
+            self.detector.request_model(name)
+
+    def update_counts(self):
+        # detector counts are keyed by VEHICLE_CLASSES, same as the side panel
+        for cls in VEHICLE_CLASSES:
+            self.vehicle_counts_live[cls] = self.detector.current_counts.get(cls, 0)
+            self.vehicle_counts_total[cls] = self.detector.total_counts.get(cls, 0)
+            self.vehicle_labels[cls].setText(f"{cls}: {self.vehicle_counts_total[cls]}")
+        self.count_hub.publish(CAMERA_NAME, self.vehicle_counts_total, self.vehicle_counts_live,
+                               lanes=self.detector.lane_stats)
+
     def capture_frame(self):
         if self.current_frame is None:
             return
@@ -239,6 +333,9 @@ class TrafficVisionApp(QWidget):
         if self.cap:
             pos = int(self.slider.value())
             self.cap.set(cv2.CAP_PROP_POS_FRAMES, pos)
+            if self.detector:
+                # track IDs / speeds / flow bins belong to the old position
+                self.detector.reset_tracker()
 
     def show_detail(self):
         dlg = DetailWindow(self.vehicle_counts_total, self)
@@ -0,0 +1,162 @@
+# utils/tracking_utils.py
+import numpy as np
+
+
+def box_iou(a, b):
+    """Element-wise IoU of two Nx4 xyxy arrays (row i of a vs row i of b)."""
+    x1 = np.maximum(a[:, 0], b[:, 0])
+    y1 = np.maximum(a[:, 1], b[:, 1])
+    x2 = np.minimum(a[:, 2], b[:, 2])
+    y2 = np.minimum(a[:, 3], b[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+
+def line_side(points, line):
+    """-1 / 0 / 1 side of each Nx2 point relative to line ((x1, y1), (x2, y2))."""
+    (x1, y1), (x2, y2) = line
+    cross = (x2 - x1) * (points[:, 1] - y1) - (y2 - y1) * (points[:, 0] - x1)
+    return np.sign(cross).astype(np.int8)
+
+
+class TrackSlots:
+    """
+    Maps tracker IDs to rows ("slots") of fixed-size per-track arrays. When the table
+    is full the least recently seen track is evicted and its slot reused.
+    """
+
+    def __init__(self, capacity=512):
+        self.capacity = capacity
+        self.track_ids = np.full(capacity, -1, dtype=np.int64)
+        self.last_seen = np.zeros(capacity, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.track_ids[:] = -1
+        self.frame = 0
+        self._slots = {}
+        self._free = list(range(self.capacity - 1, -1, -1))
+
+    def assign(self, ids):
+        """
+        Advance one frame and return (slots, new, evicted) for the IDs seen in it.
+        new marks IDs without a slot before this frame (their slot state must be reset);
+        evicted are slots taken from old tracks, read their state before resetting.
+        """
+        self.frame += 1
+        id_list = ids.tolist()
+        new = np.fromiter((i not in self._slots for i in id_list), dtype=bool, count=len(id_list))
+        slots = np.zeros(len(id_list), dtype=np.int64)
+        slots[~new] = [self._slots[i] for i, n in zip(id_list, new) if not n]
+        # mark known tracks as seen before allocating, so eviction never hits them
+        self.last_seen[slots[~new]] = self.frame
+
+        evicted = []
+        new_slots = []
+        for i, n in zip(id_list, new):
+            if not n:
+                continue
+            if not self._free:
+                age = np.where(self.track_ids >= 0, self.last_seen, np.iinfo(np.int64).max)
+                oldest = int(np.argmin(age))
+                evicted.append(oldest)
+                self.release(np.array([oldest]))
+            slot = self._free.pop()
+            self._slots[i] = slot
+            self.track_ids[slot] = i
+            self.last_seen[slot] = self.frame
+            new_slots.append(slot)
+        slots[new] = new_slots
+        return slots, new, np.array(evicted, dtype=np.int64)
+
+    def active(self):
+        return np.flatnonzero(self.track_ids >= 0)
+
+    def stale(self, max_age):
+        """Slots of tracks not seen for more than max_age frames."""
+        return np.flatnonzero((self.track_ids >= 0) & (self.frame - self.last_seen > max_age))
+
+    def release(self, slots):
+        for s in slots.tolist():
+            del self._slots[int(self.track_ids[s])]
+            self._free.append(s)
+        self.track_ids[slots] = -1
+
+
+class ClassVoter:
+    """
+    Per-track class voting. Every frame a track votes for its predicted class with
+    weight conf * IoU(previous box, current box), so frames where the tracker
+    association is doubtful count less. The class is finalized (counted once) when
+    the track crosses count_line, or when it disappears for max_age frames if no
+    line is set.
+    State lives in fixed-size arrays indexed by TrackSlots slot.
+    """
+
+    def __init__(self, num_classes, capacity=512, max_age=30, count_line=None, min_weight=0.05):
+        self.num_classes = num_classes
+        self.max_age = max_age
+        self.count_line = count_line
+        self.min_weight = min_weight
+
+        self.tracks = TrackSlots(capacity)
+        self.votes = np.zeros((capacity, num_classes), dtype=np.float32)
+        self.boxes = np.zeros((capacity, 4), dtype=np.float32)
+        self.side = np.zeros(capacity, dtype=np.int8)
+        self.counted = np.zeros(capacity, dtype=bool)
+
+    def reset(self):
+        self.tracks.reset()
+
+    def _finalize(self, slots):
+        """Classes of slots that were not counted yet, marks them counted."""
+        slots = slots[~self.counted[slots]]
+        self.counted[slots] = True
+        return self.votes[slots].argmax(axis=1).astype(np.int16)
+
+    def update(self, ids, xyxy, conf, survey):
+        """
+        ids/xyxy/conf/survey of the tracked boxes in this frame.
+        Returns (voted survey class per box, survey classes finalized this frame).
+        """
+        finalized = []
+        slots, new, evicted = self.tracks.assign(ids)
+        if len(evicted) and self.count_line is None:
+            finalized.append(self._finalize(evicted))
+        fresh = slots[new]
+        self.votes[fresh] = 0
+        self.side[fresh] = 0
+        self.counted[fresh] = False
+
+        iou = box_iou(self.boxes[slots], xyxy)
+        iou[new] = 1.0
+        weight = conf * np.maximum(iou, self.min_weight)
+        np.add.at(self.votes, (slots, survey.astype(np.int64)), weight)
+        self.boxes[slots] = xyxy
+        voted = self.votes[slots].argmax(axis=1).astype(np.int16)
+
+        if self.count_line is not None and len(slots):
+            centers = np.stack([(xyxy[:, 0] + xyxy[:, 2]) / 2, (xyxy[:, 1] + xyxy[:, 3]) / 2], axis=1)
+            side = line_side(centers, self.count_line)
+            prev = self.side[slots]
+            crossed = (prev != 0) & (side != 0) & (side != prev)
+            finalized.append(self._finalize(slots[crossed]))
+            self.side[slots] = np.where(side != 0, side, prev)
+
+        stale = self.tracks.stale(self.max_age)
+        if len(stale):
+            if self.count_line is None:
+                finalized.append(self._finalize(stale))
+            self.tracks.release(stale)
+
+        done = np.concatenate(finalized) if finalized else np.zeros(0, dtype=np.int16)
+        return voted, done
+
+    def flush(self):
+        """Finalize every active track (end of video / tracker reset)."""
+        active = self.tracks.active()
+        done = self._finalize(active) if self.count_line is None else np.zeros(0, dtype=np.int16)
+        self.tracks.release(active)
+        return done